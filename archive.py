@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+''' An indexed archive for packing many small CNF+ instances into one file
+    The data file holds, for each entry, its JSON metadata followed by the
+    (optionally zlib compressed) instance text. A separate .idx file holds
+    one fixed size record per entry, so it can be memory-mapped and searched
+    by key without reading the data. Writers append under an exclusive lock,
+    so parallel generators can share one archive.
+
+    Lookups binary search a sorted key table (.sidx), which 'archive.py index'
+    builds once the writers are done. Records appended after the table was
+    built are scanned linearly, so without a table every lookup is O(entries).
+'''
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+# key, offset of the entry, length of the metadata, length of the data, flags
+RECORD = struct.Struct('<64sQIQB')
+KEY_SIZE = 64
+COMPRESSED = 1
+# key, record number; the sorted table starts with the number of records it covers
+SORTED = struct.Struct('<64sQ')
+SORTED_HEADER = struct.Struct('<Q')
+
+def indexPath(filepath):
+    return filepath + '.idx'
+
+def sortedPath(filepath):
+    return filepath + '.sidx'
+
+def encodeKey(key):
+    raw = key.encode('utf-8')
+    if len(raw) > KEY_SIZE or b'\0' in raw:
+        raise ValueError("key '%s' must be at most %d bytes, without NUL" % (key, KEY_SIZE))
+    return raw.ljust(KEY_SIZE, b'\0')
+
+##=======================================================##
+## Writing
+
+def append(filepath, key, text, meta, compress=False):
+    ''' Append one instance, the last entry for a key wins '''
+    raw_key = encodeKey(key)
+    meta_raw = json.dumps(meta, sort_keys=True).encode('utf-8')
+    data = text.encode('utf-8')
+    flags = 0
+    if compress:
+        data = zlib.compress(data)
+        flags = flags | COMPRESSED
+
+    idx = open(indexPath(filepath), 'ab')
+    fcntl.flock(idx, fcntl.LOCK_EX)
+    try:
+        out = open(filepath, 'ab')
+        offset = out.seek(0, os.SEEK_END)
+        out.write(meta_raw)
+        out.write(data)
+        out.close()
+        # The record only goes in once its data is on disk
+        idx.write(RECORD.pack(raw_key, offset, len(meta_raw), len(data), flags))
+        idx.flush()
+    finally:
+        fcntl.flock(idx, fcntl.LOCK_UN)
+        idx.close()
+
+def buildSorted(filepath):
+    ''' Write the sorted key table covering every record appended so far '''
+    idx = open(indexPath(filepath), 'rb')
+    fcntl.flock(idx, fcntl.LOCK_SH)
+    try:
+        raw = idx.read()
+    finally:
+        fcntl.flock(idx, fcntl.LOCK_UN)
+        idx.close()
+    count = len(raw) // RECORD.size
+    # The last record for a key wins
+    latest = {}
+    for i in range(count):
+        latest[raw[i * RECORD.size:i * RECORD.size + KEY_SIZE]] = i
+    out = open(sortedPath(filepath) + '.tmp', 'wb')
+    out.write(SORTED_HEADER.pack(count))
+    for raw_key in sorted(latest):
+        out.write(SORTED.pack(raw_key, latest[raw_key]))
+    out.close()
+    os.rename(sortedPath(filepath) + '.tmp', sortedPath(filepath))
+    return len(latest)
+
+##=======================================================##
+## Reading
+
+class Archive:
+    ''' Random access to an archive through its memory-mapped index '''
+
+    def __init__(self, filepath):
+        self.data = open(filepath, 'rb')
+        self.idx = open(indexPath(filepath), 'rb')
+        size = os.fstat(self.idx.fileno()).st_size
+        self.count = size // RECORD.size
+        self.index = None
+        if self.count > 0:
+            self.index = mmap.mmap(self.idx.fileno(), self.count * RECORD.size,
+                                   access=mmap.ACCESS_READ)
+
+        # The sorted key table, if one was built
+        self.sidx = None
+        self.table = None
+        self.covered = 0
+        self.keys = 0
+        if os.path.exists(sortedPath(filepath)):
+            self.sidx = open(sortedPath(filepath), 'rb')
+            size = os.fstat(self.sidx.fileno()).st_size
+            self.keys = (size - SORTED_HEADER.size) // SORTED.size
+            if self.keys > 0:
+                self.table = mmap.mmap(self.sidx.fileno(), 0, access=mmap.ACCESS_READ)
+                self.covered = min(SORTED_HEADER.unpack_from(self.table, 0)[0], self.count)
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+        if self.sidx is not None:
+            self.sidx.close()
+        if self.index is not None:
+            self.index.close()
+        self.idx.close()
+        self.data.close()
+
+    def __record(self, i):
+        return RECORD.unpack_from(self.index, i * RECORD.size)
+
+    def __scan(self, raw_key, first):
+        # Search the records from first on, back to front; a hit must sit at
+        # a record boundary
+        start = first * RECORD.size
+        end = len(self.index)
+        while True:
+            pos = self.index.rfind(raw_key, start, end)
+            if pos < 0:
+                return None
+            if pos % RECORD.size == 0:
+                return self.__record(pos // RECORD.size)
+            end = pos + KEY_SIZE - 1
+
+    def __search(self, raw_key):
+        # Binary search the sorted key table
+        lo = 0
+        hi = self.keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, record = SORTED.unpack_from(self.table, SORTED_HEADER.size + mid * SORTED.size)
+            if mid_key < raw_key:
+                lo = mid + 1
+            elif mid_key > raw_key:
+                hi = mid
+            else:
+                return self.__record(record)
+        return None
+
+    def __find(self, key):
+        if self.index is None:
+            return None
+        raw_key = encodeKey(key)
+        # Records newer than the sorted table win
+        record = self.__scan(raw_key, self.covered)
+        if record is None and self.table is not None:
+            record = self.__search(raw_key)
+        return record
+
+    def __read(self, record):
+        raw_key, offset, meta_len, data_len, flags = record
+        self.data.seek(offset)
+        meta = json.loads(self.data.read(meta_len).decode('utf-8'))
+        data = self.data.read(data_len)
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        return meta, data.decode('utf-8')
+
+    def entries(self):
+        ''' Yields (key, metadata) in the order they were appended '''
+        for i in range(self.count):
+            record = self.__record(i)
+            self.data.seek(record[1])
+            meta = json.loads(self.data.read(record[2]).decode('utf-8'))
+            yield record[0].rstrip(b'\0').decode('utf-8'), meta
+
+    def get(self, key):
+        ''' Returns (metadata, instance text) '''
+        record = self.__find(key)
+        if record is None:
+            raise KeyError(key)
+        return self.__read(record)
+
+##=======================================================##
+
+def main():
+    argparser = argparse.ArgumentParser(description="List and extract instances from a CNF+ archive")
+    commands = argparser.add_subparsers(dest='command')
+    commands.required = True
+
+    listing = commands.add_parser('list', help='List the keys and metadata')
+    listing.add_argument('archive', type=str)
+
+    index = commands.add_parser('index', help='Build the sorted key table for fast lookups')
+    index.add_argument('archive', type=str)
+
+    extract = commands.add_parser('extract', help='Write an instance as p cnf+ text')
+    extract.add_argument('archive', type=str)
+    extract.add_argument('key', type=str)
+    extract.add_argument('out'
+                            , nargs='?'
+                            , type=str
+                            , default=''
+                            , help='Output file [default: output to stdout]')
+
+    args = argparser.parse_args()
+
+    if args.command == 'index':
+        try:
+            keys = buildSorted(args.archive)
+        except (IOError, OSError) as e:
+            argparser.error(str(e))
+        print('%d keys indexed' % keys)
+        return
+
+    try:
+        archive = Archive(args.archive)
+    except (IOError, OSError) as e:
+        argparser.error(str(e))
+    if args.command == 'list':
+        for key, meta in archive.entries():
+            sys.stdout.write("%s %s\n" % (key, json.dumps(meta, sort_keys=True)))
+    else:
+        try:
+            meta, text = archive.get(args.key)
+        except KeyError:
+            argparser.error("no instance '%s' in %s" % (args.key, args.archive))
+        if args.out != '':
+            out = open(args.out, 'w')
+            out.write(text)
+            out.close()
+        else:
+            sys.stdout.write(text)
+    archive.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+''' A differential benchmark and golden-equivalence harness for the CNF+ generators
+    Runs the reference generators next to a candidate engine across a size
+    ladder, compares their outputs by canonical hash and reports the speedup
+    and memory ratio of each pair.
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN = os.path.join(HERE, 'golden.json')
+SEED = 42
+
+def shardedTemplates(template, shards=3):
+    ''' Generate every shard of template, then merge them into {out} '''
+    script, rest = template.split(' ', 1)
+    merge = ' '.join(['{out}.%d' % i for i in range(shards)])
+    return (['%s --shard %d/%d %s' % (script, i, shards, rest.replace('{out}', '{out}.%d' % i))
+             for i in range(shards)]
+            + ['shard.py {out} ' + merge])
+
+# family: (reference command template(s), size ladder[, family it must equal])
+# Templates are formatted with the rung parameters, the seed and the outfile.
+# A list of templates runs in order, e.g. the shards and then their merge.
+# A family naming another must hash to that family's golden digest rung by
+# rung, e.g. a shard merge must equal the unsharded instance.
+FAMILIES = {
+    'nqueen':     ('nqueenGen.py {size} {out}',
+                   [{'size': 8}, {'size': 32}, {'size': 128}]),
+    'tomography': ('tomographyGen.py --seed {seed} {size} {out}',
+                   [{'size': 8}, {'size': 32}, {'size': 96}]),
+    'worddesign': ('worddesign.py {size} {out}',
+                   [{'size': 4}, {'size': 8}, {'size': 16}]),
+    'random':     ('randomGen.py --seed {seed} {n} {r} {k} {out}',
+                   [{'n': 100, 'r': 4.0, 'k': 3},
+                    {'n': 1000, 'r': 4.0, 'k': 5},
+                    {'n': 10000, 'r': 2.0, 'k': 3}]),
+    'random-sat': ('randomGen.py --sat --seed {seed} {n} {r} {k} {out}',
+                   [{'n': 100, 'r': 4.0, 'k': 3},
+                    {'n': 1000, 'r': 4.0, 'k': 5}]),
+
+    # Sharded generation
+    'nqueen-shard':     (shardedTemplates('nqueenGen.py {size} {out}'),
+                         [{'size': 8}, {'size': 32}, {'size': 128}], 'nqueen'),
+    'tomography-shard': (shardedTemplates('tomographyGen.py --seed {seed} {size} {out}'),
+                         [{'size': 8}, {'size': 32}, {'size': 96}], 'tomography'),
+    'worddesign-shard': (shardedTemplates('worddesign.py {size} {out}'),
+                         [{'size': 4}, {'size': 8}, {'size': 16}], 'worddesign'),
+    'random-shard':     (shardedTemplates('randomGen.py --sat --seed {seed} {n} {r} {k} {out}'),
+                         [{'n': 100, 'r': 4.0, 'k': 3},
+                          {'n': 1000, 'r': 4.0, 'k': 5}]),
+
+    # Symmetry breaking
+    'worddesign-symmetry':       ('worddesign.py --symmetry {size} {out}',
+                                  [{'size': 4}, {'size': 8}, {'size': 16}]),
+    'worddesign-symmetry-shard': (shardedTemplates('worddesign.py --symmetry {size} {out}'),
+                                  [{'size': 4}, {'size': 8}, {'size': 16}], 'worddesign-symmetry'),
+
+    # OPB output
+    'nqueen-opb':     ('nqueenGen.py --opb {size} {out}',
+                       [{'size': 8}, {'size': 32}]),
+    'tomography-opb': ('tomographyGen.py --opb --seed {seed} {size} {out}',
+                       [{'size': 8}, {'size': 32}]),
+    'worddesign-opb': ('worddesign.py --opb {size} {out}',
+                       [{'size': 4}, {'size': 8}]),
+    'random-opb':     ('randomGen.py --opb --seed {seed} {n} {r} {k} {out}',
+                       [{'n': 100, 'r': 4.0, 'k': 3}]),
+
+    # Planted n-queens
+    'nqueen-plant':       ('nqueenGen.py --plant 0.5 --seed {seed} {size} {out}',
+                           [{'size': 8}, {'size': 32}, {'size': 128}]),
+    'nqueen-plant-shard': (shardedTemplates('nqueenGen.py --plant 0.5 --seed {seed} {size} {out}'),
+                           [{'size': 8}, {'size': 32}, {'size': 128}], 'nqueen-plant'),
+}
+
+##=======================================================##
+## Canonical hashing
+
+def canonicalDigest(filepath):
+    ''' Hash the header, the multiset of constraints and their bounds.
+        Comments, literal order and constraint order are ignored. Handles
+        both p cnf+ and OPB files.
+    '''
+    header = None
+    constrs = []
+    f = open(filepath)
+    for line in f:
+        tokens = line.split()
+        if len(tokens) > 1 and tokens[0] == '*' and tokens[1] == '#variable=':
+            header = ' '.join(tokens)
+            continue
+        if len(tokens) == 0 or tokens[0] in ('c', '*'):
+            continue
+        if tokens[0] == 'p':
+            header = ' '.join(tokens)
+            continue
+        if tokens[-1] == ';':
+            # OPB: coefficient and variable pairs, operator, right hand side
+            terms = sorted('%s%s' % (tokens[i], tokens[i+1]) for i in range(0, len(tokens) - 3, 2))
+            constrs.append((terms, tokens[-3], int(tokens[-2])))
+            continue
+        lits = sorted(int(x) for x in tokens[:-2])
+        constrs.append((lits, tokens[-2], int(tokens[-1])))
+    f.close()
+    constrs.sort()
+    digest = hashlib.sha256()
+    digest.update(('%s\n' % header).encode())
+    for lits, op, bound in constrs:
+        digest.update(('%s %s %d\n' % (' '.join(map(str, lits)), op, bound)).encode())
+    return digest.hexdigest()
+
+##=======================================================##
+## Running generators
+
+def rungKey(family, params):
+    return family + ':' + ','.join('%s=%s' % (k, params[k]) for k in sorted(params))
+
+def runCommand(template, params, out):
+    ''' Run one generator, return (seconds, peak rss in KiB) '''
+    if isinstance(template, list):
+        # A pipeline: total time, largest peak
+        elapsed, rss = 0.0, 0
+        for step in template:
+            step_time, step_rss = runCommand(step, params, out)
+            elapsed, rss = elapsed + step_time, max(rss, step_rss)
+        return elapsed, rss
+    fields = dict(params, seed=SEED, out=out)
+    argv = shlex.split(template.format(**fields))
+    # Bare script names are resolved against the repository
+    if argv[0].endswith('.py'):
+        argv = [sys.executable, os.path.join(HERE, argv[0])] + argv[1:]
+    start = time.time()
+    proc = subprocess.Popen(argv, cwd=HERE)
+    pid, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.time() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError('%s exited with %d' % (' '.join(argv), proc.returncode))
+    return elapsed, usage.ru_maxrss
+
+def measure(template, params, tmpdir):
+    out = os.path.join(tmpdir, 'instance.cnf')
+    elapsed, rss = runCommand(template, params, out)
+    digest = canonicalDigest(out)
+    # Drop the instance and anything the steps left behind (shards, metadata)
+    for name in os.listdir(tmpdir):
+        os.remove(os.path.join(tmpdir, name))
+    return digest, elapsed, rss
+
+##=======================================================##
+
+def loadGolden():
+    if not os.path.exists(GOLDEN):
+        return {}
+    f = open(GOLDEN)
+    golden = json.load(f)
+    f.close()
+    return golden
+
+def saveGolden(golden):
+    f = open(GOLDEN, 'w')
+    json.dump(golden, f, indent=1, sort_keys=True)
+    f.write('\n')
+    f.close()
+
+def main():
+    argparser = argparse.ArgumentParser(description="Check generator engines against the reference outputs")
+    argparser.add_argument('--engine', '-e'
+                            , action='append'
+                            , default=[]
+                            , metavar='FAMILY=TEMPLATE'
+                            , help='Candidate command template for a family, e.g. '
+                                   'nqueen="fastqueens {size} {out}"')
+    argparser.add_argument('--family', '-f'
+                            , action='append'
+                            , default=[]
+                            , help='Only run these families [default: all]')
+    argparser.add_argument('--update', '-u'
+                            , action='store_true'
+                            , default=False
+                            , help='Rewrite the golden digests from the reference generators')
+    args = argparser.parse_args()
+
+    engines = {}
+    for spec in args.engine:
+        family, _, template = spec.partition('=')
+        if family not in FAMILIES:
+            argparser.error('unknown family %s' % family)
+        engines[family] = template
+    families = args.family or sorted(FAMILIES)
+
+    golden = loadGolden()
+    failures = 0
+    tmpdir = tempfile.mkdtemp()
+    print('%-36s %-8s %10s %10s %8s %8s' % ('rung', 'status', 'ref s', 'eng s', 'speedup', 'mem'))
+    for family in families:
+        template, ladder = FAMILIES[family][:2]
+        same_as = FAMILIES[family][2] if len(FAMILIES[family]) > 2 else None
+        for params in ladder:
+            key = rungKey(family, params)
+            ref_digest, ref_time, ref_rss = measure(template, params, tmpdir)
+            if args.update:
+                golden[key] = ref_digest
+            status = 'ok'
+            if golden.get(key) != ref_digest:
+                status = 'REF-DIFF' if key in golden else 'NO-GOLD'
+            elif same_as is not None and golden.get(rungKey(same_as, params)) != ref_digest:
+                status = 'NOT-SAME'
+            if family not in engines:
+                print('%-36s %-8s %10.3f' % (key, status, ref_time))
+            else:
+                eng_digest, eng_time, eng_rss = measure(engines[family], params, tmpdir)
+                if eng_digest != ref_digest:
+                    status = 'MISMATCH'
+                print('%-36s %-8s %10.3f %10.3f %7.2fx %7.2fx'
+                      % (key, status, ref_time, eng_time,
+                         ref_time / max(eng_time, 1e-9), float(eng_rss) / max(ref_rss, 1)))
+            if status != 'ok':
+                failures = failures + 1
+    shutil.rmtree(tmpdir)
+
+    if args.update:
+        saveGolden(golden)
+    if failures:
+        print('%d rung(s) failed' % failures)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+''' A generate-and-filter pipeline that keeps instances in a hardness band
+    A producer thread keeps generating candidates (randomGen, tomographyGen
+    or any generator command) while a pool of worker threads runs a local
+    solver on them with a per-job timeout. Candidates whose solve time falls
+    in the band are kept, the run stops as soon as the quota is met.
+'''
+
+import argparse
+import json
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def commandLine(template, fields):
+    argv = shlex.split(template.format(**fields))
+    # Bare script names are resolved against the repository and run with
+    # this interpreter, scripts given with a path are only run with it
+    if argv[0].endswith('.py'):
+        script = argv[0]
+        if os.sep not in script:
+            script = os.path.join(HERE, script)
+        argv = [sys.executable, script] + argv[1:]
+    return argv
+
+class Pipeline:
+    ''' Overlaps candidate generation with a pool of solver subprocesses '''
+
+    def __init__(self, gen, solver, lo, hi, quota, workers, outdir, seed=1, max_candidates=0):
+        self.gen = gen
+        self.solver = solver
+        self.lo = lo
+        self.hi = hi
+        self.quota = quota
+        self.workers = workers
+        self.outdir = outdir
+        self.seed = seed
+        self.max_candidates = max_candidates
+
+        # Generated candidates waiting for a worker, a few are kept ready
+        self.candidates = queue.Queue(maxsize=workers)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}       # worker -> solver process, to kill on stop
+        self.tmpdir = None
+        self.log = None
+        self.error = None
+
+        # Metrics
+        self.generated = 0
+        self.solved = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.kept = []
+        self.gen_time = 0.0
+        self.solve_time = 0.0
+
+    ##=======================================================##
+    ## Producer
+
+    def __produce(self):
+        try:
+            self.__generate()
+        except Exception as e:
+            with self.lock:
+                if self.error is None:
+                    self.error = 'generator failed: %s' % e
+                self.__halt()
+        # One marker per worker, the workers drain the queue so this can not block
+        for i in range(self.workers):
+            self.candidates.put(None)
+
+    def __generate(self):
+        seed = self.seed
+        while not self.stop.is_set():
+            if self.max_candidates and seed - self.seed >= self.max_candidates:
+                break
+            out = os.path.join(self.tmpdir, 'cand-%d.cnf' % seed)
+            start = time.time()
+            status = subprocess.call(commandLine(self.gen, {'seed': seed, 'out': out}))
+            with self.lock:
+                self.gen_time = self.gen_time + time.time() - start
+                self.generated = self.generated + 1
+            if status != 0:
+                with self.lock:
+                    if self.error is None:
+                        self.error = 'generator exited with %d for seed %d' % (status, seed)
+                    self.__halt()
+                break
+            # Block while the workers are busy, but notice a stop
+            while not self.stop.is_set():
+                try:
+                    self.candidates.put((seed, out), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            seed = seed + 1
+
+    ##=======================================================##
+    ## Workers
+
+    def __solve(self, worker, seed, path):
+        # Checking for a stop and registering the solver is one step, so
+        # __halt can not miss a solver that is just starting
+        with self.lock:
+            if self.stop.is_set():
+                return None
+            proc = subprocess.Popen(commandLine(self.solver, {'file': path}),
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.running[worker] = proc
+        start = time.time()
+        try:
+            status = proc.wait(timeout=self.hi)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            status = None
+        elapsed = time.time() - start
+        with self.lock:
+            del self.running[worker]
+        return status, elapsed
+
+    def __work(self, worker):
+        # A worker always keeps draining the queue up to its marker, even
+        # after a failure, so the producer can never block on a full queue
+        while True:
+            job = self.candidates.get()
+            if job is None:
+                break
+            try:
+                self.__job(worker, job)
+            except Exception as e:
+                with self.lock:
+                    if self.error is None:
+                        self.error = 'worker %d failed: %s' % (worker, e)
+                    self.__halt()
+
+    def __job(self, worker, job):
+        seed, path = job
+        solved = self.__solve(worker, seed, path)
+        if solved is None:
+            os.remove(path)
+            return
+        status, elapsed = solved
+
+        with self.lock:
+            self.solve_time = self.solve_time + elapsed
+            if self.stop.is_set():
+                # Killed because the quota was met
+                os.remove(path)
+                return
+            keep = False
+            if status is None:
+                self.timeouts = self.timeouts + 1
+                result = 'timeout'
+            elif status in (0, 10, 20):
+                self.solved = self.solved + 1
+                result = 'solved'
+                keep = self.lo <= elapsed <= self.hi and len(self.kept) < self.quota
+            else:
+                self.failed = self.failed + 1
+                result = 'exit %d' % status
+            if keep:
+                kept = os.path.join(self.outdir, os.path.basename(path))
+                shutil.move(path, kept)
+                self.kept.append(kept)
+            else:
+                os.remove(path)
+            self.log.write('%d,%.3f,%s,%d\n' % (seed, elapsed, result, keep))
+            self.log.flush()
+            if len(self.kept) >= self.quota:
+                self.__halt()
+
+    def __halt(self):
+        # Called with the lock held
+        self.stop.set()
+        for proc in self.running.values():
+            proc.kill()
+
+    ##=======================================================##
+
+    def metrics(self, elapsed):
+        return {
+            'elapsed': elapsed,
+            'generated': self.generated,
+            'solved': self.solved,
+            'timeouts': self.timeouts,
+            'failed': self.failed,
+            'kept': len(self.kept),
+            'generation_seconds': self.gen_time,
+            'solver_seconds': self.solve_time,
+            'candidates_per_second': self.generated / max(elapsed, 1e-9),
+            'kept_per_hour': 3600.0 * len(self.kept) / max(elapsed, 1e-9),
+            'worker_utilisation': self.solve_time / max(elapsed * self.workers, 1e-9),
+        }
+
+    def run(self):
+        if not os.path.isdir(self.outdir):
+            os.makedirs(self.outdir)
+        self.tmpdir = tempfile.mkdtemp(dir=self.outdir)
+        self.log = open(os.path.join(self.outdir, 'log.csv'), 'w')
+        self.log.write('seed,seconds,result,kept\n')
+
+        start = time.time()
+        producer = threading.Thread(target=self.__produce)
+        producer.daemon = True
+        producer.start()
+        workers = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.__work, args=(i,))
+            thread.start()
+            workers.append(thread)
+        for thread in workers:
+            thread.join()
+        self.stop.set()
+        producer.join()
+        elapsed = time.time() - start
+
+        # Drop whatever was generated but never solved
+        shutil.rmtree(self.tmpdir)
+        self.log.close()
+        metrics = self.metrics(elapsed)
+        out = open(os.path.join(self.outdir, 'metrics.json'), 'w')
+        json.dump(metrics, out, indent=1, sort_keys=True)
+        out.write('\n')
+        out.close()
+        return metrics
+
+def main():
+    argparser = argparse.ArgumentParser(description="Generate instances and keep those in a solve time band")
+    argparser.add_argument('--gen', '-g'
+                            , type=str
+                            , required=True
+                            , help='Generator command template with {seed} and {out}, e.g. '
+                                   '"randomGen.py --sat --seed {seed} 500 4.0 5 {out}"')
+    argparser.add_argument('--solver', '-S'
+                            , type=str
+                            , required=True
+                            , help='Solver command template with {file}, e.g. "minisat+ {file}"')
+    argparser.add_argument('--band', '-b'
+                            , type=float
+                            , nargs=2
+                            , default=[10.0, 60.0]
+                            , metavar=('LO', 'HI')
+                            , help='Solve time band in wall-clock seconds, HI is also the timeout '
+                                   '[default: 10 60]')
+    argparser.add_argument('--quota', '-q'
+                            , type=int
+                            , default=10
+                            , help='Number of instances to keep [default: 10]')
+    argparser.add_argument('--workers', '-j'
+                            , type=int
+                            , default=max(1, (os.cpu_count() or 1) - 1)
+                            , help='Number of solver processes, the generator needs a cpu too '
+                                   '[default: number of cpus - 1]')
+    argparser.add_argument('--seed'
+                            , type=int
+                            , default=1
+                            , help='Seed of the first candidate [default: 1]')
+    argparser.add_argument('--max-candidates'
+                            , type=int
+                            , default=0
+                            , help='Give up after this many candidates [default: no limit]')
+    argparser.add_argument('outdir'
+                            , type=str
+                            , help='Directory for the kept instances, log.csv and metrics.json')
+    args = argparser.parse_args()
+
+    if args.band[0] > args.band[1]:
+        argparser.error('the band is empty')
+    if args.quota < 1 or args.workers < 1:
+        argparser.error('--quota and --workers must be positive')
+
+    pipeline = Pipeline(args.gen, args.solver, args.band[0], args.band[1], args.quota,
+                        args.workers, args.outdir, args.seed, args.max_candidates)
+    metrics = pipeline.run()
+    for key in sorted(metrics):
+        print('%-24s %s' % (key, metrics[key]))
+    if pipeline.error is not None:
+        argparser.error(pipeline.error)
+    if metrics['kept'] < args.quota:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,10 @@
 '''
 
 import argparse
+import random
+import sys
+import shard
+import opb
 
 class Generator:
     # Problem Size
@@ -18,38 +22,88 @@ class Generator:
     Constrs=[]  # a set of tuples: ([list of literals], bound)
     Comments=[]
     
+    # Planted solution
+    solution=[] # solution[row] = col
+    planted=[]  # rows whose queen is pre-placed
+    
+    # Sharding: only constraints with index in [shard_lo,shard_hi) are kept
+    shard=None
+    shard_lo=0
+    shard_hi=0
+    constr_index=0
+    
     # Constructor
-    def __init__(self,n):
+    def __init__(self,n,shard_spec=None):
         self.n = n
         self.num_var = n * n
         self.num_constr = (7 * n) - 6
+        self.shard = shard_spec
 
     # Get the variable for a given (row,col)
     def __getVar(self, row, col):
         return row*self.n + col + 1  # 1-based counting for variables
 
+    # Skip the next k constraints if none of them fall in the shard
+    def __skipConstrs(self,k):
+        if self.constr_index + k <= self.shard_lo or self.constr_index >= self.shard_hi:
+            self.constr_index = self.constr_index + k
+            return True
+        return False
+    
+    def __keepConstr(self,constr):
+        if self.shard_lo <= self.constr_index < self.shard_hi:
+            self.Constrs.append(constr)
+        self.constr_index = self.constr_index + 1
+
+    # Explicit construction of a solution in O(n), no search involved
+    # (Hoffman, Loessi and Moore 1969). Odd n reuses the n-1 board and puts
+    # the last queen in the bottom right corner.
+    def __constructSolution(self):
+        n = self.n
+        m = n - (n % 2)
+        half = m // 2
+        cols = [0] * n
+        if m % 6 != 2:
+            for i in range(half):
+                cols[i] = 2*i + 1
+                cols[half + i] = 2*i
+        else:
+            for i in range(half):
+                col = (2*i + half - 1) % m
+                cols[i] = col
+                cols[m - 1 - i] = m - 1 - col
+        if n % 2 == 1:
+            cols[n-1] = n-1
+        self.solution = cols
+
     # Constraint creators
     def __createConstrsQUEENS(self):
         for j in range(self.n):
+            if self.__skipConstrs(1):
+                continue
             # For each column, there must be at least one queen
             # == there must be at most n-1 "not queens" (negated literals)
             lits=[-self.__getVar(i,j) for i in range(self.n)]
             # At most one of these is true
-            self.Constrs.append((lits,self.n-1))
+            self.__keepConstr((lits,self.n-1))
 
     def __createConstrsROW(self):
         for i in range(self.n):
+            if self.__skipConstrs(1):
+                continue
             # For each row, include every cell
             lits=[self.__getVar(i,j) for j in range(self.n)]
             # At most one of these is true
-            self.Constrs.append((lits,1))
+            self.__keepConstr((lits,1))
 
     def __createConstrsCOL(self):
         for j in range(self.n):
+            if self.__skipConstrs(1):
+                continue
             # For each column, include every cell
             lits=[self.__getVar(i,j) for i in range(self.n)]
             # At most one of these is true
-            self.Constrs.append((lits,1))
+            self.__keepConstr((lits,1))
     
     def __createConstrsDIA(self):
         n = self.n
@@ -59,6 +113,9 @@ class Generator:
         # So I start at n-1
         front = n-1
         while(front >= 1):
+            if self.__skipConstrs(1):
+                front = front - 1
+                continue
             lits=[]
             current = front
             while(True):
@@ -67,7 +124,7 @@ class Generator:
                 
                 # End of the diagonal
                 if((current%n) == 0):
-                    self.Constrs.append((lits,1))
+                    self.__keepConstr((lits,1))
                     break
                 # Add n+1 (down 1 to the right)
                 current = current + n + 1
@@ -84,6 +141,9 @@ class Generator:
         end = ((n-1) * n)+1
         
         while(front < end):
+            if self.__skipConstrs(1):
+                front = front + n
+                continue
             lits=[]
             current = front
             while(True):
@@ -92,7 +152,7 @@ class Generator:
             
                 # End of the diagonal
                 if(current > end):
-                    self.Constrs.append((lits,1))
+                    self.__keepConstr((lits,1))
                     break
                 # Add n+1 (down 1 to the right)
                 current = current + n + 1
@@ -104,6 +164,9 @@ class Generator:
         # right corner
         front = 2
         while(front <= n):
+            if self.__skipConstrs(1):
+                front = front + 1
+                continue
             lits=[]
             current = front
             while(True):
@@ -112,7 +175,7 @@ class Generator:
         
                 # End of the diagonal
                 if((current%n) == 1):
-                    self.Constrs.append((lits,1))
+                    self.__keepConstr((lits,1))
                     break
                 
                 # Add n-1 (down 1 to the left)
@@ -126,6 +189,9 @@ class Generator:
         front = n + n
         end = n * (n-1)
         while(front <= end):
+            if self.__skipConstrs(1):
+                front = front + n
+                continue
             lits=[]
             current = front
             while(True):
@@ -134,7 +200,7 @@ class Generator:
                 
                 # End of the diagonal
                 if(current > end):
-                    self.Constrs.append((lits,1))
+                    self.__keepConstr((lits,1))
                     break
                     
                 # Add n-1 (down 1 to the left)
@@ -143,6 +209,13 @@ class Generator:
             #Move the start one row down
             front = front + n
 
+    def __createConstrsPLANT(self):
+        for i in self.planted:
+            if self.__skipConstrs(1):
+                continue
+            # The queen is there == its negation is at most 0
+            self.__keepConstr(([-self.__getVar(i,self.solution[i])],0))
+
     def __writeComments(self,out):
         for comment in self.Comments:
             line = "c " + comment
@@ -155,29 +228,61 @@ class Generator:
        for constr in self.Constrs:
             lits = constr[0]
             bound = constr[1]
-            line = ''
-            for lit in lits:
-                line = line + "%d " % lit
-            line = line + "<= %d" % bound
+            line = ' '.join(["%d" % lit for lit in lits])
+            line = line + " <= %d" % bound
             out.write(line + '\n')
 
+    def __writeSolution(self,out):
+        for i in range(self.n):
+            out.write("%d %d\n" % (i+1, self.solution[i]+1))
+
 ##=======================================================##
 
     def addComment(self,comment):
         self.Comments.append(comment)
-        
+
+    # Pre-place a fraction of the queens of a constructed solution
+    def plant(self,fraction):
+        if self.n in (2,3):
+            raise ValueError('%d-queens has no solution' % self.n)
+        self.__constructSolution()
+        count = int(round(fraction * self.n))
+        self.planted = sorted(random.sample(range(self.n),count))
+        self.num_constr = self.num_constr + count
+
     def genConstrs(self):
+        # A plain run keeps every constraint
+        self.shard_hi = sys.maxsize
+        if self.shard is not None:
+            self.shard_lo, self.shard_hi = shard.shardRange(self.num_constr,self.shard)
         self.__createConstrsQUEENS()
         self.__createConstrsROW()
         self.__createConstrsCOL()
         self.__createConstrsDIA()
-        
+        self.__createConstrsPLANT()
+
+    def saveSolution(self,filepath):
+        out = open(filepath,'w')
+        self.__writeSolution(out)
+        out.close()
+
     def toDimacsP(self,filepath):
         out = open(filepath,'w')
         self.__writeComments(out)
         self.__writeDescript(out)
         self.__writeConstrs(out)
         out.close()
+    
+    def toOPB(self,filepath):
+        out = open(filepath,'w')
+        opb.writeOPB(out,self.num_var,self.Constrs,self.Comments)
+        out.close()
+    
+    def toShard(self,filepath):
+        out = open(filepath,'w')
+        self.__writeConstrs(out)
+        out.close()
+        shard.writeMeta(filepath,self.shard,len(self.Constrs),self.num_var,self.Comments)
 ## END OF CLASS DEF
 
 def main():
@@ -190,19 +295,66 @@ def main():
     argparser.add_argument('out'
                             , type=str
                             , help='Outfile location')
+    argparser.add_argument('--plant','-p'
+                            , type=float
+                            , default=None
+                            , metavar='FRACTION'
+                            , help='Pre-place this fraction of the queens of a constructed solution')
+    argparser.add_argument('--solution'
+                            , type=str
+                            , default=''
+                            , help='Save the planted solution (row col per line) to a file')
+    argparser.add_argument('--seed'
+                            , type=int
+                            , default=None
+                            , help='Seed for choosing the pre-placed queens')
+    argparser.add_argument('--opb'
+                            , action='store_true'
+                            , default=False
+                            , help='Write the instance in OPB (pseudo-Boolean) format')
+    argparser.add_argument('--shard'
+                            , type=shard.parseShard
+                            , default=None
+                            , metavar='i/N'
+                            , help='Only write the i-th of N shards (see shard.py)')
     
     args = argparser.parse_args()
+    if args.shard is not None and args.opb:
+        argparser.error('--shard writes cnf+ shards, --opb can not be combined with it')
+    if args.plant is not None and not 0.0 <= args.plant <= 1.0:
+        argparser.error('--plant takes a fraction between 0 and 1')
+    if args.solution != '' and args.plant is None:
+        argparser.error('--solution needs --plant')
+    if args.shard is not None and args.plant is not None and args.seed is None:
+        argparser.error('--shard with --plant needs --seed so every shard plants the same queens')
+    if args.seed is not None:
+        random.seed(args.seed)
     
     # Setup generator
-    gen = Generator(args.size)
+    gen = Generator(args.size,args.shard)
     
     # Add comment
     gen.addComment("%d-queens" % args.size)
     #if(args.comment):
         #add extra comment
+    
+    if args.plant is not None:
+        try:
+            gen.plant(args.plant)
+        except ValueError as e:
+            argparser.error(str(e))
+        gen.addComment("%d of %d queens pre-placed" % (len(gen.planted), args.size))
 
     gen.genConstrs()
     
-    gen.toDimacsP(args.out)
+    if args.shard is not None:
+        gen.toShard(args.out)
+    elif args.opb:
+        gen.toOPB(args.out)
+    else:
+        gen.toDimacsP(args.out)
+    
+    if args.solution != '':
+        gen.saveSolution(args.solution)
     
 main()
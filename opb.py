@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+''' An OPB (pseudo-Boolean) writer for CNF+ constraints
+    Each at-most constraint ([list of lits], bound) becomes a linear
+    constraint over 0/1 variables, a negated literal -x is written as (1 - x).
+    Complement pairs (lits, b) followed by (-lits, len(lits)-b), as emitted by
+    tomographyGen and worddesign, are merged into one equality.
+'''
+
+def isComplement(first, second):
+    lits, bound = first
+    neg_lits, neg_bound = second
+    if len(lits) != len(neg_lits) or neg_bound != len(lits) - bound:
+        return False
+    for i in range(len(lits)):
+        if neg_lits[i] != -lits[i]:
+            return False
+    return True
+
+def mergeComplements(constrs):
+    ''' Yields (lits, op, bound), with op one of '<=' and '=' '''
+    pending = None
+    for constr in constrs:
+        if pending is None:
+            pending = constr
+        elif isComplement(pending, constr):
+            yield pending[0], '=', pending[1]
+            pending = None
+        else:
+            yield pending[0], '<=', pending[1]
+            pending = constr
+    if pending is not None:
+        yield pending[0], '<=', pending[1]
+
+def writeConstr(out, lits, op, bound):
+    # Move the constant of every negated literal to the right hand side
+    rhs = bound
+    for lit in lits:
+        if lit < 0:
+            rhs = rhs - 1
+    # Only >= and = are in the basic OPB format, so flip <=
+    sign = 1
+    if op == '<=':
+        sign = -1
+        op = '>='
+        rhs = -rhs
+    for lit in lits:
+        if lit > 0:
+            out.write("%+d x%d " % (sign, lit))
+        else:
+            out.write("%+d x%d " % (-sign, -lit))
+    out.write("%s %d ;\n" % (op, rhs))
+
+def writeOPB(out, num_vars, constrs, comments):
+    ''' Stream constrs to out; constrs is walked twice, once to count '''
+    num_constr = 0
+    for constr in mergeComplements(constrs):
+        num_constr = num_constr + 1
+    out.write("* #variable= %d #constraint= %d\n" % (num_vars, num_constr))
+    for comment in comments:
+        out.write("* " + comment + '\n')
+    for lits, op, bound in mergeComplements(constrs):
+        writeConstr(out, lits, op, bound)
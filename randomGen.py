@@ -8,6 +8,11 @@ import random
 import math
 import argparse
 import sys
+import io
+from array import array
+import shard
+import opb
+import archive
 
 class Generator:
     ''' A tunable generator for creating random instances in the DIMACS+ format'''
@@ -24,20 +29,99 @@ class Generator:
     comments = []       # A list of comments
     constrs = []        # A liset of tuples ([list of lits], bound)
     assignment = []     # A full assignment chosen
+    slots = None        # A flat array of variable occurrences (regular mode)
+    repair_tries = 16   # Attempts at fixing a duplicate before giving up
+    
+    # Sharding: only constraints [shard_lo,shard_hi) are generated, each
+    # shard from its own stream derived from the seed
+    shard = None
+    seed = None
+    shard_lo = 0
+    shard_hi = 0
     
     # Methods
-    def __init__(self, n, r, k):
+    def __init__(self, n, r, k, shard_spec=None, seed=None):
         self.num_var = n
         self.ratio = r
         self.size_constr = k
         self.num_constr=int(n*r)
         self.available = range(1,n+1)# + range(-1,-(n+1),-1)
+        self.shard = shard_spec
+        self.seed = seed
+        self.shard_hi = self.num_constr
+        if shard_spec is not None:
+            self.shard_lo, self.shard_hi = shard.shardRange(self.num_constr,shard_spec)
 
     def __genConstraint(self):
         lits = random.sample(self.available, self.size_constr)
-        lits = [x*random.choice([1,-1]) for x in lits]  # randomly swap polarities
+        return self.__signConstraint(lits)
+
+    def __signConstraint(self,vars):
+        lits = [x*random.choice([1,-1]) for x in vars]  # randomly swap polarities
         bound = random.randint(1,self.size_constr-1)
         return lits,bound
+
+    def __genSlots(self):
+        # Every variable gets floor(k*m/n) occurrences, the remainder is
+        # handed out to randomly chosen variables
+        total = self.num_constr * self.size_constr
+        per_var, extra = divmod(total, self.num_var)
+        self.slots = array('l', range(1,self.num_var+1)) * per_var
+        self.slots.extend(random.sample(self.available, extra))
+
+    def __drawSlot(self):
+        # Swap-remove a random slot so each draw is O(1)
+        slots = self.slots
+        i = random.randrange(len(slots))
+        var = slots[i]
+        slots[i] = slots[-1]
+        slots.pop()
+        return var
+
+    def __repairSlot(self,row,var,forceTrue):
+        # Trade the duplicate with a variable of an earlier constraint
+        for i in range(self.repair_tries):
+            if len(self.constrs) == 0:
+                break
+            constr = random.choice(self.constrs)
+            lits = constr[0]
+            j = random.randrange(len(lits))
+            other = int(math.fabs(lits[j]))
+            if other in row or var in [int(math.fabs(x)) for x in lits]:
+                continue
+            old = lits[j]
+            lits[j] = var if old > 0 else -var
+            if forceTrue and not self.__covers(constr):
+                lits[j] = old
+                continue
+            return other
+        # Out of luck, fall back to any variable not in the row
+        return self.__freeVar(row)
+
+    def __freeVar(self,row):
+        var = random.randint(1,self.num_var)
+        while var in row:
+            var = random.randint(1,self.num_var)
+        return var
+
+    def __genRegularConstraint(self,forceTrue):
+        row = []
+        while len(row) < self.size_constr:
+            if len(self.slots) == 0:
+                # Only happens after a fallback repair dropped a slot
+                row.append(self.__freeVar(row))
+                continue
+            var = self.__drawSlot()
+            tries = 0
+            # Put duplicates back and redraw a bounded number of times
+            while var in row and tries < self.repair_tries and len(self.slots) > 0:
+                self.slots.append(var)
+                var = self.__drawSlot()
+                tries = tries + 1
+            if var in row:
+                var = self.__repairSlot(row,var,forceTrue)
+            row.append(var)
+        return row
     
     def __writeComments(self,out):
         for comment in self.comments:
@@ -97,18 +181,61 @@ class Generator:
         if filepath != '':
             out.close()
     
-    def genFormula(self, forceTrue):
+    def toOPB(self,filepath):
+        if filepath != '':
+            out = open(filepath,'w')
+        else:
+            out = sys.stdout
+        opb.writeOPB(out,self.num_var,self.constrs,self.comments)
+        if filepath != '':
+            out.close()
+    
+    def toArchive(self,filepath,key,meta,compress=False):
+        out = io.StringIO()
+        self.__writeComments(out)
+        self.__writeDescript(out)
+        self.__writeConstrs(out)
+        archive.append(filepath,key,out.getvalue(),meta,compress)
+    
+    def toShard(self,filepath):
+        out = open(filepath,'w')
+        self.__writeConstrs(out)
+        out.close()
+        shard.writeMeta(filepath,self.shard,len(self.constrs),self.num_var,self.comments)
+    
+    def genFormula(self, forceTrue, regular=False):
         if forceTrue:
             self.__genAssign()
             #TODO: add flag to print out the assignment
+        
+        # Every shard shares the assignment but draws its own constraints
+        if self.shard is not None:
+            random.seed('%d:%d/%d' % ((self.seed,) + self.shard))
+        
+        if regular:
+            self.__genRegularFormula(forceTrue)
+            return
             
         # Generate the constraints
-        for i in range(self.num_constr):
+        for i in range(self.shard_lo,self.shard_hi):
             constr = self.__genConstraint()
             while forceTrue and not self.__covers(constr):
                 constr = self.__genConstraint()
             self.__addConstr(constr)
 
+    def __genRegularFormula(self, forceTrue):
+        # Configuration model: each variable appears about k*m/n times
+        if self.size_constr > self.num_var:
+            raise ValueError('constraints of size %d need at least %d variables' % (self.size_constr, self.size_constr))
+        self.__genSlots()
+        for i in range(self.num_constr):
+            row = self.__genRegularConstraint(forceTrue)
+            # Keep the variables, only redraw polarities and bound
+            constr = self.__signConstraint(row)
+            while forceTrue and not self.__covers(constr):
+                constr = self.__signConstraint(row)
+            self.__addConstr(constr)
+
 
 ## END OF CLASS DEF            
 ##============================================================##
@@ -120,6 +247,32 @@ def main():
                             , action='store_true'
                             , default=False
                             , help='Generate a known satisfiable instance')
+    argparser.add_argument('--regular','-g'
+                            , action='store_true'
+                            , default=False
+                            , help='Balance variable occurrences (configuration model)')
+    argparser.add_argument('--seed'
+                            , default=None
+                            , type=int
+                            , help='Seed for the random number generator')
+    argparser.add_argument('--opb'
+                            , action='store_true'
+                            , default=False
+                            , help='Write the instance in OPB (pseudo-Boolean) format')
+    argparser.add_argument('--shard'
+                            , type=shard.parseShard
+                            , default=None
+                            , metavar='i/N'
+                            , help='Only write the i-th of N shards (see shard.py), needs --seed. '
+                                   'The merged instance differs from an unsharded run.')
+    argparser.add_argument('--archive','-a'
+                            , type=str
+                            , default=''
+                            , help='Append the instance to this archive (see archive.py), out is its key')
+    argparser.add_argument('--compress','-z'
+                            , action='store_true'
+                            , default=False
+                            , help='Compress the instance in the archive')
     argparser.add_argument('n'
                             , type=int
                             , help='Number of variables')
@@ -135,23 +288,61 @@ def main():
                             , default=''
                             , help='Output file [default: output to stdout]')
     args = argparser.parse_args()
+    if args.k > args.n:
+        argparser.error('the size of the constraints can not exceed the number of variables')
+    if args.shard is not None and args.seed is None:
+        argparser.error('--shard needs --seed so every shard draws the same assignment')
+    if args.shard is not None and args.opb:
+        argparser.error('--shard writes cnf+ shards, --opb can not be combined with it')
+    if args.shard is not None and args.out == '':
+        argparser.error('--shard needs an output file')
+    if args.shard is not None and args.regular:
+        argparser.error('--regular draws from one shared pool and can not be sharded')
+    if args.archive != '' and (args.shard is not None or args.opb):
+        argparser.error('--archive stores cnf+ instances, it can not be combined with --shard or --opb')
+    if args.archive != '' and args.seed is None:
+        # Archived instances are always reproducible from their metadata
+        args.seed = random.randrange(2**32)
+    if args.archive != '' and args.out == '':
+        # The modes change the instance, so they are part of its key
+        args.out = 'n%d-r%g-k%d-s%d' % (args.n, args.r, args.k, args.seed)
+        if args.sat:
+            args.out = args.out + '-sat'
+        if args.regular:
+            args.out = args.out + '-reg'
+    if args.seed is not None:
+        random.seed(args.seed)
     
     # Setup Generator
-    gen = Generator(args.n,args.r,args.k)
+    gen = Generator(args.n,args.r,args.k,args.shard,args.seed)
     if (args.sat):
         gen.known='SAT'
     
     # Add comments
     gen.addComment('Randomly generated %s cnf+ instance' % gen.known )
     gen.addComment('n:%d r:%f k:%d' % (args.n, args.r, args.k) )
+    if args.regular:
+        gen.addComment('regular: ~%d occurrences per variable' % (gen.num_constr*args.k // args.n))
     if args.out != '':
         gen.addComment(args.out)
     
     # Generate constraints
-    gen.genFormula(args.sat)
+    gen.genFormula(args.sat,args.regular)
     
     # Write to outfile
-    gen.toDimacsP(args.out)
+    if args.shard is not None:
+        gen.toShard(args.out)
+    elif args.archive != '':
+        meta = {'n': args.n, 'r': args.r, 'k': args.k, 'seed': args.seed,
+                'sat': args.sat, 'regular': args.regular}
+        try:
+            gen.toArchive(args.archive,args.out,meta,args.compress)
+        except ValueError as e:
+            argparser.error(str(e))
+    elif args.opb:
+        gen.toOPB(args.out)
+    else:
+        gen.toDimacsP(args.out)
     
 main()
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+''' Sharded generation helpers and a merge tool for CNF+ shards
+    A generator run with --shard i/N writes only its share of the constraints
+    to a headerless shard file plus a small .meta file. This script streams
+    the shards together in order and writes the p cnf+ header.
+'''
+
+import argparse
+import shutil
+
+##=======================================================##
+## Helpers for the generators
+
+def parseShard(text):
+    ''' argparse type for "i/N" '''
+    try:
+        i, n = [int(x) for x in text.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected i/N, got '%s'" % text)
+    if n < 1 or i < 0 or i >= n:
+        raise argparse.ArgumentTypeError("shard %s out of range" % text)
+    return i, n
+
+def shardRange(total, shard):
+    ''' The [lo,hi) constraint indices owned by shard (i,N) '''
+    i, n = shard
+    return total * i // n, total * (i + 1) // n
+
+def metaPath(filepath):
+    return filepath + '.meta'
+
+def writeMeta(filepath, shard, num_constr, max_var, comments):
+    out = open(metaPath(filepath), 'w')
+    out.write("shard %d/%d\n" % shard)
+    out.write("constrs %d\n" % num_constr)
+    out.write("maxvar %d\n" % max_var)
+    for comment in comments:
+        out.write("c %s\n" % comment)
+    out.close()
+
+def readMeta(filepath):
+    meta = {'comments': []}
+    f = open(metaPath(filepath))
+    for line in f:
+        key, _, value = line.rstrip('\n').partition(' ')
+        if key == 'c':
+            meta['comments'].append(value)
+        elif key == 'shard':
+            meta['shard'] = parseShard(value)
+        else:
+            meta[key] = int(value)
+    f.close()
+    return meta
+
+##=======================================================##
+## Merging
+
+def merge(outpath, shardpaths):
+    metas = [readMeta(path) for path in shardpaths]
+
+    # The shards must be 0/N .. N-1/N, in order
+    total = len(shardpaths)
+    for i in range(total):
+        if metas[i]['shard'] != (i, total):
+            raise ValueError("%s is shard %d/%d, expected %d/%d"
+                             % ((shardpaths[i],) + metas[i]['shard'] + (i, total)))
+
+    num_constr = sum(meta['constrs'] for meta in metas)
+    max_var = max(meta['maxvar'] for meta in metas)
+
+    out = open(outpath, 'w')
+    for comment in metas[0]['comments']:
+        out.write("c " + comment + '\n')
+    out.write("p cnf+ %d %d\n" % (max_var, num_constr))
+    # Stream each shard through a fixed size buffer
+    for path in shardpaths:
+        f = open(path)
+        shutil.copyfileobj(f, out)
+        f.close()
+    out.close()
+
+def main():
+    argparser = argparse.ArgumentParser(description="Merge CNF+ shards into one instance")
+    argparser.add_argument('out'
+                            , type=str
+                            , help='Outfile location')
+    argparser.add_argument('shards'
+                            , nargs='+'
+                            , type=str
+                            , help='Shard files, in order 0/N .. N-1/N')
+    args = argparser.parse_args()
+
+    try:
+        merge(args.out, args.shards)
+    except (ValueError, KeyError, IOError) as e:
+        argparser.error(str(e))
+
+if __name__ == '__main__':
+    main()
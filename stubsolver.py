@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+''' A stand-in solver for testing hardness.py
+    Sleeps for a pseudo solve time derived from the instance contents, so the
+    same instance always takes the same time, then reports UNKNOWN.
+'''
+
+import argparse
+import hashlib
+import time
+
+def main():
+    argparser = argparse.ArgumentParser(description="A stub solver that only sleeps")
+    argparser.add_argument('--scale'
+                            , type=float
+                            , default=1.0
+                            , help='Longest pseudo solve time in seconds')
+    argparser.add_argument('instance'
+                            , type=str
+                            , help='Instance file')
+    args = argparser.parse_args()
+
+    f = open(args.instance, 'rb')
+    digest = hashlib.sha256(f.read()).digest()
+    f.close()
+    # Uniform in [0, scale)
+    fraction = int.from_bytes(digest[:4], 'big') / float(2**32)
+    time.sleep(fraction * args.scale)
+    print("s UNKNOWN")
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,9 @@
 
 import argparse
 import random
+import sys
+import shard
+import opb
 
 class Generator:
     
@@ -21,9 +24,22 @@ class Generator:
     comments = []       # A collection of comments
     constrs=[]          # An array of tuples ([list of lits],bound)
     
+    # Sharding: only constraints with index in [shard_lo,shard_hi) are kept
+    shard=None
+    shard_lo=0
+    shard_hi=0
+    constr_index=0
+    
         
-    def __init__(self,n):
+    def __init__(self,n,shard_spec=None):
         self.n = n
+        self.shard = shard_spec
+        # A plain run keeps every constraint
+        self.shard_hi = sys.maxsize
+        if shard_spec is not None:
+            # Each row, column and diagonal (of length > 1) gives two constraints
+            total = 2 * (n + n + (4 * n) - 6)
+            self.shard_lo, self.shard_hi = shard.shardRange(total,shard_spec)
         for i in range(n):
             self.cols.append(0)
             self.rows.append(0)
@@ -49,14 +65,29 @@ class Generator:
         pos_bound = bound
         neg_bound = len(pos_lits) - pos_bound
         # Add the constraints
-        self.constrs.append((pos_lits,pos_bound))
-        self.constrs.append((neg_lits,neg_bound))
+        self.__keepConstr((pos_lits,pos_bound))
+        self.__keepConstr((neg_lits,neg_bound))
+    
+    # Skip the next k constraints if none of them fall in the shard
+    def __skipConstrs(self,k):
+        if self.constr_index + k <= self.shard_lo or self.constr_index >= self.shard_hi:
+            self.constr_index = self.constr_index + k
+            return True
+        return False
+    
+    def __keepConstr(self,constr):
+        if self.shard_lo <= self.constr_index < self.shard_hi:
+            self.constrs.append(constr)
+        self.constr_index = self.constr_index + 1
     
     def __createConstrsCOL(self):
         n = self.n
         # For each column
         i=1
         while(i<=n):
+            if self.__skipConstrs(2):
+                i = i + 1
+                continue
             lits=[]
             num_filled = self.cols[i-1]
             # Get each variable
@@ -79,6 +110,9 @@ class Generator:
         # For each row
         i = 0
         while(i<n):
+            if self.__skipConstrs(2):
+                i = i + 1
+                continue
             lits = []
             num_filled = self.rows[i]
             # Get each variable
@@ -103,6 +137,9 @@ class Generator:
         # So I start at n-1
         front = n-1
         while(front >= 1):
+            if self.__skipConstrs(2):
+                front = front - 1
+                continue
             lits=[]
             current = front
             num_filled = 0
@@ -130,6 +167,9 @@ class Generator:
         end = ((n-1) * n)+1
         
         while(front < end):
+            if self.__skipConstrs(2):
+                front = front + n
+                continue
             lits=[]
             current = front
             num_filled = 0
@@ -152,6 +192,9 @@ class Generator:
         # right corner
         front = 2
         while(front <= n):
+            if self.__skipConstrs(2):
+                front = front + 1
+                continue
             lits=[]
             current = front
             num_filled = 0
@@ -176,6 +219,9 @@ class Generator:
         front = n + n
         end = n * (n-1)
         while(front <= end):
+            if self.__skipConstrs(2):
+                front = front + n
+                continue
             lits=[]
             current = front
             num_filled = 0
@@ -247,6 +293,17 @@ class Generator:
         self.__writeDescript(out)
         self.__writeConstrs(out)
         out.close()
+    
+    def toOPB(self,filepath):
+        out = open(filepath,'w')
+        opb.writeOPB(out,self.n*self.n,self.constrs,self.comments)
+        out.close()
+    
+    def toShard(self,filepath):
+        out = open(filepath,'w')
+        self.__writeConstrs(out)
+        out.close()
+        shard.writeMeta(filepath,self.shard,len(self.constrs),self.n*self.n,self.comments)
 ## End of class definition
 
 def main():
@@ -256,24 +313,48 @@ def main():
                             , default=''
                             , type=str
                             , help='Save the random assignment to a file')
+    argparser.add_argument('--seed'
+                            , default=None
+                            , type=int
+                            , help='Seed for the random number generator')
     argparser.add_argument('size' 
                             , type=int
                             , help='Size of the grid (N x N')
     argparser.add_argument('out'
                             , type=str
                             , help='Outfile location')
+    argparser.add_argument('--opb'
+                            , action='store_true'
+                            , default=False
+                            , help='Write the instance in OPB (pseudo-Boolean) format')
+    argparser.add_argument('--shard'
+                            , type=shard.parseShard
+                            , default=None
+                            , metavar='i/N'
+                            , help='Only write the i-th of N shards (see shard.py), needs --seed')
     
     args = argparser.parse_args()
+    if args.shard is not None and args.opb:
+        argparser.error('--shard writes cnf+ shards, --opb can not be combined with it')
+    if args.shard is not None and args.seed is None:
+        argparser.error('--shard needs --seed so every shard draws the same assignment')
+    if args.seed is not None:
+        random.seed(args.seed)
     
     # Setup generator
-    gen = Generator(args.size)
+    gen = Generator(args.size,args.shard)
     
     # Add comment
     gen.addComment("Tomography instance %d" % args.size)
     # Generate the formula
     gen.genFormula()
     # Save to a file
-    gen.toDimacsP(args.out)
+    if args.shard is not None:
+        gen.toShard(args.out)
+    elif args.opb:
+        gen.toOPB(args.out)
+    else:
+        gen.toDimacsP(args.out)
     
     if(args.store != ''):
         gen.saveAssigns(args.store)
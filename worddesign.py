@@ -5,6 +5,9 @@
 '''
 
 import argparse
+import sys
+import shard
+import opb
 
 class Generator:
     
@@ -31,13 +34,52 @@ class Generator:
     constrs=[]
     comments=[]
     
-    def __init__(self,n):
+    # Sharding: only constraints with index in [shard_lo,shard_hi) are kept
+    shard=None
+    shard_lo=0
+    shard_hi=0
+    constr_index=0
+    
+    # Incremental instances: only words [first,w) get new constraints, the
+    # header is padded so it can be patched in place when growing
+    first=0
+    symmetry=False
+    header_width=48
+    header_offset=0
+    size_comment="%d-worddesign"
+    comment_offset=-1
+    
+    def __init__(self,n,shard_spec=None):
        self.w = n 
+       self.shard = shard_spec
+    
+    # Number of constraints in each family, known from the size alone
+    def __numConstrs(self,symmetry):
+        w = self.w
+        pairs = w * (w-1) // 2
+        block = self.p * self.l + 1
+        num = 2*w + pairs*block + (pairs+w)*block + 2*w*self.p
+        if symmetry:
+            lex = self.p * self.l * (self.l-1) // 2 + (self.p-1) * self.l
+            num = num + (w-1)*lex + (self.p // 2)*2
+        return num
+    
+    # Skip the next k constraints if none of them fall in the shard
+    def __skipConstrs(self,k):
+        if self.constr_index + k <= self.shard_lo or self.constr_index >= self.shard_hi:
+            self.constr_index = self.constr_index + k
+            return True
+        return False
+    
+    def __keepConstr(self,constr):
+        if self.shard_lo <= self.constr_index < self.shard_hi:
+            self.constrs.append(constr)
+        self.constr_index = self.constr_index + 1
     
     def __genVars(self):
         
         # For each word
-        for w in range(self.w):
+        for w in range(self.first,self.w):
             
             # For each position
             for p in range(self.p):
@@ -52,7 +94,9 @@ class Generator:
     def __genConstrsA(self):
         
         # For each word
-        for w in range(self.w):
+        for w in range(self.first,self.w):
+            if self.__skipConstrs(2):
+                continue
             
             pos_lits=[]
             neg_lits=[]
@@ -69,8 +113,8 @@ class Generator:
                 neg_lits.append(-c)
                 neg_lits.append(-g)
             
-            self.constrs.append((pos_lits,4))
-            self.constrs.append((neg_lits,len(neg_lits)-4))
+            self.__keepConstr((pos_lits,4))
+            self.__keepConstr((neg_lits,len(neg_lits)-4))
     
     # Each pair of distinct words in S differ in at least 4 positions
     # Each pair of distinct words in S are the same in at most 4 positions
@@ -78,7 +122,10 @@ class Generator:
         
         # For each pair of words
         for w1 in range(self.w):
-            for w2 in range(w1+1,self.w):
+            for w2 in range(max(w1+1,self.first),self.w):
+                if self.__skipConstrs(self.p*self.l+1):
+                    self.num_vars = self.num_vars + self.p*self.l
+                    continue
                 
                 # Set of the vars for each comparison
                 comps=[]
@@ -98,15 +145,18 @@ class Generator:
                         lits.append(self.prop_v[(w1,p,l)])
                         lits.append(self.prop_v[(w2,p,l)])
                         lits.append(-self.comp_b[((w1,p,l),(w2,p,l))])
-                        self.constrs.append((lits,2))
+                        self.__keepConstr((lits,2))
                         
-                self.constrs.append((comps,4))
+                self.__keepConstr((comps,4))
                 
     def __genConstrsC(self):
         
         # For each pair of words x and y where x and y may be identical
         for w1 in range(self.w):
-            for w2 in range(w1,self.w):
+            for w2 in range(max(w1,self.first),self.w):
+                if self.__skipConstrs(self.p*self.l+1):
+                    self.num_vars = self.num_vars + self.p*self.l
+                    continue
                 
                 # Set of the vars for each comparison
                 comps=[]
@@ -138,17 +188,19 @@ class Generator:
                         lits.append(self.prop_v[(w1,p1,l)])
                         lits.append(self.prop_v[(w2,p,l2)])
                         lits.append(-self.comp_c[((w1,p1,l),(w2,p,l2))])
-                        self.constrs.append((lits,2))
+                        self.__keepConstr((lits,2))
                         
-                self.constrs.append((comps,4))
+                self.__keepConstr((comps,4))
     
     # For each position of each word, only one letter can be assigned
     def __genConstrsD(self):
         
         # For each word
-        for w in range(self.w):
+        for w in range(self.first,self.w):
             # For each position
             for p in range(self.p):
+                if self.__skipConstrs(2):
+                    continue
                 pos_lits=[]
                 neg_lits=[]
                 
@@ -158,17 +210,73 @@ class Generator:
                     pos_lits.append(var)
                     neg_lits.append(-var)
                 
-                self.constrs.append((pos_lits,1))
-                self.constrs.append((neg_lits,len(neg_lits)-1))
+                self.__keepConstr((pos_lits,1))
+                self.__keepConstr((neg_lits,len(neg_lits)-1))
+    
+    # Symmetry breaking: consecutive words are in lexicographic order
+    # (letters ordered A < T < C < G), i.e. w <= w+1
+    def __genConstrsLex(self):
+        
+        # For each pair of consecutive words
+        for w in range(max(self.first-1,0),self.w-1):
+            lex = self.p * self.l * (self.l-1) // 2 + (self.p-1) * self.l
+            if self.__skipConstrs(lex):
+                self.num_vars = self.num_vars + self.p - 1
+                continue
+            
+            # eq is the helper that is forced true when the words agree on
+            # every position before p, it is implicitly true for p = 0
+            eq = None
+            for p in range(self.p):
+                
+                # If the prefixes agree, w+1 can not take a smaller letter
+                # not(eq and x(w,p,l1) and x(w+1,p,l2)) for l2 < l1
+                for l1 in range(self.l):
+                    for l2 in range(l1):
+                        lits=[self.prop_v[(w,p,l1)], self.prop_v[(w+1,p,l2)]]
+                        if eq is not None:
+                            lits.append(eq)
+                        self.__keepConstr((lits,len(lits)-1))
+                
+                # The last position has nothing after it to order
+                if p == self.p-1:
+                    break
+                
+                # Create the helper for the next prefix
+                self.num_vars = self.num_vars + 1
+                next_eq = self.num_vars
+                
+                # (eq and x(w,p,l) and x(w+1,p,l)) implies next_eq
+                for l in range(self.l):
+                    lits=[self.prop_v[(w,p,l)], self.prop_v[(w+1,p,l)], -next_eq]
+                    if eq is not None:
+                        lits.append(eq)
+                    self.__keepConstr((lits,len(lits)-1))
+                
+                eq = next_eq
+    
+    # Symmetry breaking: swapping A/T (or C/G) at positions p and 7-p in
+    # every word is a symmetry, so the first word can be restricted to A or C
+    # on its first half. This stays sound with the lexicographic order since
+    # the swaps are applied greedily from position 0 onwards.
+    def __genConstrsFirst(self):
+        
+        for p in range(self.p // 2):
+            for l in (1,3):
+                self.__keepConstr(([self.prop_v[(0,p,l)]],0))
             
                 
-    def __writeComments(self,out):
+    def __writeComments(self,out,width=0):
         for comment in self.comments:
             line = "c " + comment
+            # The size comment is padded so a growing instance can patch it
+            if width and comment == self.size_comment % self.w:
+                self.comment_offset = out.tell()
+                line = line.ljust(width)
             out.write(line + '\n')
         
-    def __writeDescript(self,out):
-        out.write("p cnf+ %d %d\n" % (self.num_vars,len(self.constrs)))
+    def __writeDescript(self,out,width=0):
+        out.write(("p cnf+ %d %d" % (self.num_vars,len(self.constrs))).ljust(width) + '\n')
     
     def __writeConstrs(self,out):
        for constr in self.constrs:
@@ -185,12 +293,20 @@ class Generator:
     def addComment(self,comment):
         self.comments.append(comment)
         
-    def genConstrs(self):
+    def genConstrs(self,symmetry=False):
+        self.symmetry = symmetry
+        # A plain run keeps every constraint
+        self.shard_hi = sys.maxsize
+        if self.shard is not None:
+            self.shard_lo, self.shard_hi = shard.shardRange(self.__numConstrs(symmetry),self.shard)
         self.__genVars()
         self.__genConstrsA()
         self.__genConstrsB()
         self.__genConstrsC()
         self.__genConstrsD()
+        if symmetry:
+            self.__genConstrsLex()
+            self.__genConstrsFirst()
         
     def toDimacsP(self,filepath):
         out = open(filepath,'w')
@@ -198,28 +314,155 @@ class Generator:
         self.__writeDescript(out)
         self.__writeConstrs(out)
         out.close()
+    
+    # Read the state written next to an incremental instance
+    def loadState(self,filepath):
+        f = open(filepath + '.words')
+        state = {}
+        for line in f:
+            tokens = line.split()
+            state[tokens[0]] = [int(x) for x in tokens[1:]]
+        f.close()
+        self.first = state['w'][0]
+        self.symmetry = state['symmetry'][0] > 0
+        self.num_vars = state['vars'][0]
+        self.constr_index = state['constrs'][0]
+        self.header_offset = state['header'][0]
+        self.comment_offset = state['comment'][0]
+        # Rebuild the letter variables of the existing words
+        for w in range(self.first):
+            base = state['words'][w]
+            for p in range(self.p):
+                for l in range(self.l):
+                    self.prop_v[(w,p,l)] = base + p*self.l + l
+    
+    def saveState(self,filepath):
+        out = open(filepath + '.words','w')
+        out.write("w %d\n" % self.w)
+        out.write("symmetry %d\n" % self.symmetry)
+        out.write("vars %d\n" % self.num_vars)
+        out.write("constrs %d\n" % self.constr_index)
+        out.write("header %d\n" % self.header_offset)
+        out.write("comment %d\n" % self.comment_offset)
+        out.write("words %s\n" % ' '.join(["%d" % self.prop_v[(w,0,0)] for w in range(self.w)]))
+        out.close()
+    
+    # Grow an instance from the saved number of words to self.w, only the
+    # new words' variables and the A, B, C, D (and Lex) constraints that
+    # involve them are generated
+    def extendConstrs(self):
+        self.shard_hi = sys.maxsize
+        self.__genVars()
+        self.__genConstrsA()
+        self.__genConstrsB()
+        self.__genConstrsC()
+        self.__genConstrsD()
+        if self.symmetry:
+            self.__genConstrsLex()
+    
+    # Write an instance whose header can be patched by extendDimacsP
+    def toIncrementalDimacsP(self,filepath):
+        out = open(filepath,'w')
+        self.__writeComments(out,self.header_width)
+        self.header_offset = out.tell()
+        self.__writeDescript(out,self.header_width)
+        self.__writeConstrs(out)
+        out.close()
+        self.saveState(filepath)
+    
+    # Append the new constraints and patch the header in place
+    def extendDimacsP(self,filepath):
+        out = open(filepath,'a')
+        self.__writeConstrs(out)
+        out.close()
+        out = open(filepath,'r+')
+        out.seek(self.header_offset)
+        out.write(("p cnf+ %d %d" % (self.num_vars,self.constr_index)).ljust(self.header_width))
+        if self.comment_offset >= 0:
+            out.seek(self.comment_offset)
+            out.write(("c " + self.size_comment % self.w).ljust(self.header_width))
+        out.close()
+        self.saveState(filepath)
+    
+    def toOPB(self,filepath):
+        out = open(filepath,'w')
+        opb.writeOPB(out,self.num_vars,self.constrs,self.comments)
+        out.close()
+    
+    def toShard(self,filepath):
+        out = open(filepath,'w')
+        self.__writeConstrs(out)
+        out.close()
+        shard.writeMeta(filepath,self.shard,len(self.constrs),self.num_vars,self.comments)
 ## END OF CLASS DEF
                         
 def main():
     argparser = argparse.ArgumentParser(description="a word design generator for CNF+")
     
+    argparser.add_argument('--symmetry','-y'
+                            , action='store_true'
+                            , default=False
+                            , help='Add symmetry breaking constraints (lexicographic word order)')
     argparser.add_argument('size'
                             , type=int
                             , help='Size of the problem: the number of words to search for')
     argparser.add_argument('out'
                             , type=str
                             , help='Outfile location')
+    argparser.add_argument('--incremental','-i'
+                            , action='store_true'
+                            , default=False
+                            , help='Write a growable instance (padded header and a .words state file)')
+    argparser.add_argument('--extend','-e'
+                            , action='store_true'
+                            , default=False
+                            , help='Grow the incremental instance in out to size words')
+    argparser.add_argument('--opb'
+                            , action='store_true'
+                            , default=False
+                            , help='Write the instance in OPB (pseudo-Boolean) format')
+    argparser.add_argument('--shard'
+                            , type=shard.parseShard
+                            , default=None
+                            , metavar='i/N'
+                            , help='Only write the i-th of N shards (see shard.py)')
                             
     args = argparser.parse_args()
+    if args.shard is not None and args.opb:
+        argparser.error('--shard writes cnf+ shards, --opb can not be combined with it')
+    if (args.incremental or args.extend) and (args.shard is not None or args.opb):
+        argparser.error('--incremental and --extend only write cnf+ instances')
     
     # Setup generator
-    gen = Generator(args.size)
+    gen = Generator(args.size,args.shard)
+    
+    if args.extend:
+        try:
+            gen.loadState(args.out)
+        except (IOError, KeyError, IndexError, ValueError) as e:
+            argparser.error('can not read the state of %s: %s' % (args.out, e))
+        if args.size <= gen.first:
+            argparser.error('%s already has %d words' % (args.out, gen.first))
+        if args.symmetry != gen.symmetry:
+            argparser.error('--symmetry must match the original instance')
+        gen.extendConstrs()
+        gen.extendDimacsP(args.out)
+        return
     
     # Add comment
-    gen.addComment("%d-worddesign" % args.size)
+    gen.addComment(gen.size_comment % args.size)
+    if args.symmetry:
+        gen.addComment("with symmetry breaking")
     
-    gen.genConstrs()
+    gen.genConstrs(args.symmetry)
     
-    gen.toDimacsP(args.out)
+    if args.shard is not None:
+        gen.toShard(args.out)
+    elif args.incremental:
+        gen.toIncrementalDimacsP(args.out)
+    elif args.opb:
+        gen.toOPB(args.out)
+    else:
+        gen.toDimacsP(args.out)
     
 main()